@@ -1,10 +1,40 @@
 import streamlit as st
 import yfinance as yf
+try:
+    # Drop-in wrapper with a persistent on-disk cache: warm runs only fetch
+    # the incremental delta instead of re-downloading history.
+    import yfinance_cache as yfc
+except ImportError:
+    yfc = yf
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+try:
+    # Transparent on-disk HTTP cache: repeat Yahoo requests within the
+    # expiry window never touch the network.
+    import requests_cache
+except ImportError:
+    requests_cache = None
 import json
-import plotly.express as px
-import pandas as pd
 import time
+import random
+try:
+    # Rust JSON: ~3-5x faster than stdlib for encoding bodies and decoding
+    # the 50-200KB replies a Detailed Analysis can produce.
+    import orjson
+    def _json_dumps(obj): return orjson.dumps(obj)  # bytes -- requests accepts them
+    def _json_loads(data): return orjson.loads(data)
+except ImportError:
+    _json_dumps = json.dumps
+    _json_loads = json.loads
+import asyncio
+import threading
+from streamlit.runtime.scriptrunner import add_script_run_ctx
+import string
+from types import MappingProxyType
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # --- CONFIGURATION ---
 try:
@@ -13,7 +43,30 @@ except:
     st.error("⚠️ API Key not found. Please set it in Streamlit Secrets.")
     st.stop()
 
-WATCHLIST = ["NVDA", "TSLA", "AAPL", "AMD", "MSFT", "BTC-USD", "ETH-USD"]
+WATCHLIST = ("NVDA", "TSLA", "AAPL", "AMD", "MSFT", "BTC-USD", "ETH-USD")
+
+# Rotation order:
+# 1. Flash-8b (Lightweight, separate quota)
+# 2. Flash (Standard)
+# 3. Flash-Exp (Experimental, usually free)
+GEMINI_MODELS = [
+    "gemini-1.5-flash-8b",
+    "gemini-1.5-flash",
+    "gemini-2.0-flash-exp"
+]
+GEMINI_URL = "https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={key}"
+GEMINI_STREAM_URL = "https://generativelanguage.googleapis.com/v1beta/models/{model}:streamGenerateContent?alt=sse&key={key}"
+GEMINI_HEADERS = {'Content-Type': 'application/json'}
+
+# Prompt skeletons built once at import -- Streamlit reruns the whole script
+# on every widget change, so per-rerun f-string assembly adds up
+SYSTEM_ANALYST = "Act as a Wall Street Analyst."
+SYSTEM_MANAGER = "Act as a Hedge Fund Manager."
+SYSTEM_ADVISOR = "Act as an investment advisor. Give specific ticker recommendations."
+PROMPT_MOOD = string.Template("Data: $data. Give a short market mood summary.")
+PROMPT_WINNER = string.Template("Data: $data. Name the biggest winner and why.")
+PROMPT_CHAT = string.Template("CONTEXT: $context. USER: $question. STYLE: $style")
+PROMPT_STRATEGY = string.Template("Budget: $$$budget. Risk: $risk. Allocation: $alloc.")
 
 # --- SETUP PAGE ---
 st.set_page_config(page_title="Gemini 5.2 Lite", layout="wide")
@@ -21,87 +74,455 @@ st.title("🚀 Gemini 5.2 TradeStation (Lite Mode)")
 
 # --- FUNCTIONS ---
 
-def get_gemini_response(prompt):
+CACHE_DIR = ".cache/gemini"
+
+@st.cache_resource
+def get_gemini_session():
+    """One HTTP session per server process. cache_resource keeps the live
+    object across reruns (and users), so keep-alive connections survive."""
+    session = requests.Session()
+    # Pool big enough for the parallel prompt fan-out without evicting sockets.
+    # Retry only covers connect-level flakes; HTTP 429/5xx handling stays in
+    # the rotator, which knows when to switch models instead.
+    session.mount("https://", HTTPAdapter(
+        pool_connections=10, pool_maxsize=10,
+        max_retries=Retry(total=2, backoff_factor=0.3)
+    ))
+    return session
+
+def _cache_get(prompt, ttl):
+    """Returns a cached answer for this prompt if it is younger than ttl seconds."""
+    path = os.path.join(CACHE_DIR, hashlib.md5(prompt.encode()).hexdigest() + ".json")
+    try:
+        if time.time() - os.path.getmtime(path) < ttl:
+            with open(path) as f:
+                return json.load(f)["text"]
+    except:
+        pass
+    return None
+
+def _cache_put(prompt, text):
+    """Saves an answer to disk. Written via a temp file so readers never see half a file."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = os.path.join(CACHE_DIR, hashlib.md5(prompt.encode()).hexdigest() + ".json")
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"text": text}, f)
+    os.replace(tmp, path)
+
+def _build_body(prompt, system=None):
+    """Request body with the fixed role text as a system_instruction --
+    Gemini caches the system prompt server-side, so the recurring cost
+    is only the dynamic data/question tokens."""
+    data = {"contents": [{"parts": [{"text": prompt}]}]}
+    if system:
+        data["system_instruction"] = {"parts": [{"text": system}]}
+    return _json_dumps(data)
+
+def _preferred_model():
+    """The model that answered last -- skip straight to it instead of
+    re-proving the rotation on every call. Guarded so worker threads
+    without a script context just see None."""
+    try:
+        return st.session_state.get('working_model')
+    except:
+        return None
+
+def _remember_model(model):
+    try:
+        st.session_state['working_model'] = model
+    except:
+        pass
+
+def _forget_model():
+    try:
+        st.session_state.pop('working_model', None)
+    except:
+        pass
+
+TRANSIENT_CODES = (429, 503, 504)
+
+def _post_model(model, body, timeout=(3, 30), stream=False, retries=3):
+    """POSTs one model. No Streamlit calls here -- it runs on worker threads.
+    Separate connect/read timeouts so a hung call can't stall the UI.
+
+    Transient statuses (429/503/504) are retried on the SAME model with
+    exponential backoff + jitter, honoring Retry-After when Google sends
+    one -- a rate-limited Flash call usually recovers in ~1s and shouldn't
+    demote us to a slower model. Anything else (400/403/404) is returned
+    immediately so the rotator can switch models."""
+    url = (GEMINI_STREAM_URL if stream else GEMINI_URL).format(model=model, key=API_KEY)
+    for attempt in range(retries):
+        response = get_gemini_session().post(url, headers=GEMINI_HEADERS, data=body,
+                                             stream=stream, timeout=timeout)
+        if response.status_code not in TRANSIENT_CODES or attempt == retries - 1:
+            break
+        retry_after = response.headers.get('Retry-After')
+        try:
+            delay = float(retry_after)
+        except (TypeError, ValueError):
+            delay = random.uniform(0, 2 ** attempt * 0.5)
+        time.sleep(delay)
+    return response
+
+class GeminiUnavailable(Exception):
+    """Every model in the rotation failed; str(exc) is the last error seen."""
+
+@st.cache_data(ttl=120, show_spinner=False)
+def _generate(prompt, ttl=600, system=None):
     """
-    VERSION 5.2: The 'Lite' Rotator
-    Prioritizes the '8b' model which is lightweight and less likely to hit quotas.
-    Adds a sleep timer to avoid spamming the API.
+    VERSION 5.3: The 'Lite' Rotator, now a race.
+    Models are submitted concurrently with a small stagger (the cheap 8b
+    model keeps its head start so we don't burn the other quotas while it
+    is healthy) and the first 200 wins; the rest are cancelled. The
+    critical path becomes the fastest responder instead of the sum of
+    failed attempts.
+    Answers are cached on disk for `ttl` seconds, so repeat prompts cost nothing.
     """
-    # 1. Flash-8b (Lightweight, separate quota)
-    # 2. Flash (Standard)
-    # 3. Flash-Exp (Experimental, usually free)
-    models_to_try = [
-        "gemini-1.5-flash-8b", 
-        "gemini-1.5-flash", 
-        "gemini-2.0-flash-exp"
-    ]
-    
-    headers = {'Content-Type': 'application/json'}
-    data = {"contents": [{"parts": [{"text": prompt}]}]}
-    
+    cache_key = f"{system or ''}|{prompt}"
+    cached = _cache_get(cache_key, ttl)
+    if cached is not None:
+        return cached
+
+    body = _build_body(prompt, system)
     last_error = ""
-    status_placeholder = st.empty() # Show the user what is happening
-    
-    for model in models_to_try:
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={API_KEY}"
-        
-        # Show which model we are trying
-        status_placeholder.caption(f"🔄 Trying AI Model: {model}...")
-        
+
+    # Fast path: go straight to the model that answered last time
+    preferred = _preferred_model()
+    if preferred:
         try:
-            response = requests.post(url, headers=headers, data=json.dumps(data))
-            
+            response = _post_model(preferred, body)
+            if response.status_code == 200:
+                text = _json_loads(response.content)['candidates'][0]['content']['parts'][0]['text']
+                _cache_put(cache_key, text)
+                return text
+            _forget_model()  # went stale -- re-probe the full rotation
+        except Exception as e:
+            last_error = str(e)
+            _forget_model()
+
+    # No `with` block here: that would shutdown(wait=True) on exit and make
+    # the winner block until every loser finished its retries and timeouts.
+    # Instead we shut down without waiting once we have an answer; losers
+    # finish (or get cancelled) in the background.
+    ex = ThreadPoolExecutor(max_workers=len(GEMINI_MODELS))
+    try:
+        futures = {}
+        for i, model in enumerate(GEMINI_MODELS):
+            if i:
+                time.sleep(0.3)
+                # If an earlier model already answered, don't spend more quota
+                if any(f.done() and f.exception() is None and f.result().status_code == 200
+                       for f in futures):
+                    break
+            futures[ex.submit(_post_model, model, body)] = model
+
+        for fut in as_completed(futures):
+            try:
+                response = fut.result()
+            except Exception as e:
+                last_error = str(e)
+                continue
+
             if response.status_code == 200:
-                status_placeholder.empty() # Clear the status message
-                return response.json()['candidates'][0]['content']['parts'][0]['text']
-            
+                _remember_model(futures[fut])
+                text = _json_loads(response.content)['candidates'][0]['content']['parts'][0]['text']
+                _cache_put(cache_key, text)
+                return text
             elif response.status_code == 429:
                 last_error = "Quota Exceeded (429)"
-                time.sleep(2) # Wait 2 seconds before retrying so we don't get banned
+            else:
+                last_error = f"Error {response.status_code}"
+    finally:
+        ex.shutdown(wait=False, cancel_futures=True)
+
+    # Raise instead of returning the cooldown string: st.cache_data caches
+    # return values but not exceptions, so (like the disk tier) the 120s
+    # memory tier only ever holds successes. The wrapper below turns this
+    # back into the user-facing message.
+    raise GeminiUnavailable(last_error)
+
+def get_gemini_response(prompt, ttl=600, system=None):
+    """Uncached front door for _generate: same answer on success, the
+    cooldown message on total failure -- without memoizing the failure."""
+    try:
+        return _generate(prompt, ttl, system)
+    except GeminiUnavailable as e:
+        return f"⚠️ System Cooldown: Please wait 60 seconds. Google says: {e}"
+
+def stream_gemini(prompt, ttl=600, system=None):
+    """
+    Yields the answer chunk by chunk as Gemini generates it, so the user
+    sees text after a few hundred ms instead of waiting for the full reply.
+    Uses the same model rotation and disk cache as get_gemini_response;
+    cached answers come back in one piece.
+    """
+    cache_key = f"{system or ''}|{prompt}"
+    cached = _cache_get(cache_key, ttl)
+    if cached is not None:
+        yield cached
+        return
+
+    # Identical payload for every model attempt -- serialize it once
+    body = _build_body(prompt, system)
+    last_error = ""
+
+    models = list(GEMINI_MODELS)
+    preferred = _preferred_model()
+    if preferred in models:
+        models.insert(0, models.pop(models.index(preferred)))
+
+    for model in models:
+        try:
+            response = _post_model(model, body, stream=True)
+
+            if response.status_code == 200:
+                parts = []
+                for line in response.iter_lines():
+                    if not line.startswith(b"data: "):
+                        continue
+                    chunk = _json_loads(line[len(b"data: "):])
+                    try:
+                        text = chunk['candidates'][0]['content']['parts'][0]['text']
+                    except (KeyError, IndexError):
+                        continue  # final chunks may carry metadata only
+                    parts.append(text)
+                    yield text
+                _remember_model(model)
+                _cache_put(cache_key, "".join(parts))
+                return
+
+            elif response.status_code == 429:
+                # _post_model already backed off; move on to the next model
+                last_error = "Quota Exceeded (429)"
                 continue
-            
+
             else:
                 last_error = f"Error {response.status_code}"
                 continue
-                
+
         except Exception as e:
             last_error = str(e)
             time.sleep(1)
             continue
-            
-    status_placeholder.error("All models busy.")
-    return f"⚠️ System Cooldown: Please wait 60 seconds. Google says: {last_error}"
 
+    yield f"⚠️ System Cooldown: Please wait 60 seconds. Google says: {last_error}"
+
+async def get_gemini_response_async(prompt, system=None):
+    """Async wrapper around the rotator so several prompts can run at once."""
+    return await asyncio.to_thread(get_gemini_response, prompt, 600, system)
+
+def run_many(prompts, system=None):
+    """
+    Fans a list of prompts out in parallel and returns the answers in order.
+    N prompts take roughly as long as the slowest one instead of the sum.
+    """
+    async def _gather():
+        return await asyncio.gather(*[get_gemini_response_async(p, system) for p in prompts])
+    return asyncio.run(_gather())
+
+def batch_ask(prompts, ttl=600, system=None):
+    """
+    Answers several independent prompts with ONE Gemini round trip by
+    numbering the questions and splitting the reply on a sentinel line.
+    Halves the round-trip count vs. the parallel fan-out; falls back to
+    run_many if the model ignores the format.
+    """
+    if len(prompts) == 1:
+        return [get_gemini_response(prompts[0], ttl=ttl, system=system)]
+    combined = (
+        f"Answer the following {len(prompts)} questions. "
+        "Separate the answers with a line containing only '###'.\n"
+        + "\n".join(f"{i + 1}) {p}" for i, p in enumerate(prompts))
+    )
+    answers = [a.strip() for a in get_gemini_response(combined, ttl=ttl, system=system).split("###")]
+    if len(answers) != len(prompts):
+        return run_many(prompts, system=system)
+    return answers
+
+@st.cache_resource
+def get_yf_session():
+    """Shared session for all Yahoo traffic: one TLS handshake, then
+    keep-alive. Thread-safe for the parallel scan fallback. With
+    requests-cache installed it also persists responses to sqlite for
+    60s, so repeat scans are served from disk with zero network."""
+    if requests_cache is not None:
+        session = requests_cache.CachedSession(
+            ".yf_cache", backend="sqlite", expire_after=60, allowable_codes=(200,)
+        )
+    else:
+        session = requests.Session()
+    session.headers['User-Agent'] = 'Mozilla/5.0'
+    return session
+
+_TICKERS = {}
+
+def get_ticker(sym):
+    """One yf.Ticker per symbol -- no point rebuilding the object every rerun."""
+    if sym not in _TICKERS:
+        try:
+            _TICKERS[sym] = yfc.Ticker(sym, session=get_yf_session())
+        except TypeError:
+            # yfinance-cache's Ticker doesn't take a session
+            _TICKERS[sym] = yfc.Ticker(sym)
+    return _TICKERS[sym]
+
+@st.cache_data(ttl=600, show_spinner=False)
+def history(sym, period):
+    return get_ticker(sym).history(period=period)
+
+def get_price(ticker):
+    """Just the latest price -- no news, no extras, one lightweight request."""
+    try:
+        # fast_info hits the lightweight quote endpoint -- a scalar instead of
+        # the full OHLC payload we'd otherwise download just to read Close.
+        # Deliberately a FRESH Ticker, not the memoized one: yfinance caches
+        # fast_info on the instance after first read, so the _TICKERS copy
+        # would serve the same price forever. Construction is cheap; the
+        # freshness window is get_safe_data's 60s cache_data TTL.
+        return yf.Ticker(ticker, session=get_yf_session()).fast_info["last_price"]
+    except Exception:  # fall back to history, whatever fast_info threw
+        hist = history(ticker, "1d")
+        # raw ndarray access skips the pandas indexing machinery entirely
+        arr = hist['Close'].values
+        return float(arr[-1]) if arr.size else 0.0
+
+@st.cache_data(ttl=60, show_spinner=False)
 def get_safe_data(ticker):
     try:
-        stock = yf.Ticker(ticker)
-        hist = stock.history(period="1d")
-        price = hist['Close'].iloc[-1] if not hist.empty else 0.0
-        return f"{ticker}: ${price:,.2f}"
-    except:
+        return f"{ticker}: ${get_price(ticker):,.2f}"
+    except (requests.RequestException, KeyError, IndexError):
+        # narrow on purpose: Ctrl-C still works and real bugs surface
         return f"{ticker}: Data Unavailable"
 
+@st.cache_data(ttl=300, show_spinner=False)
 def get_chart_data(ticker):
-    stock = yf.Ticker(ticker)
-    hist = stock.history(period="1mo")
-    return hist
+    hist = history(ticker, "1mo")
+    # The chart only draws Close, so don't cache (or ship) the other six
+    # columns; float32 halves the JSON Plotly sends to the browser and
+    # prices render at 2 decimals anyway so nothing visible is lost
+    hist = hist[['Close']].astype({'Close': 'float32'})
+    # reset_index so the cached object is a plain serializable frame
+    return hist.reset_index()
+
+@st.cache_data(ttl=300, show_spinner=False)
+def build_chart(ticker):
+    """Whole figure cached per ticker -- flipping the selectbox between
+    already-seen tickers skips both the fetch and Plotly construction."""
+    import plotly.express as px  # deferred: only pay the import if a chart renders
+    chart_data = get_chart_data(ticker)
+    # webgl renders via Scattergl, which keeps scaling if the period grows
+    fig = px.line(chart_data, x='Date', y='Close', render_mode='webgl',
+                  title=f"{ticker} - 30 Day Price Trend")
+    fig.update_layout(xaxis_title="Date", yaxis_title="Price ($)")
+    return fig
+
+def get_batch_data(tickers):
+    """
+    Fetches the whole watchlist in ONE request instead of one per ticker.
+    Yahoo accepts ~20 symbols per call, so this cuts scan time roughly N x.
+    Returns None if the batch call fails so the caller can fall back.
+    """
+    try:
+        return yf.download(
+            tickers=" ".join(tickers),
+            period="1d",
+            interval="1d",
+            group_by='ticker',
+            threads=True,
+            progress=False
+        )
+    except:
+        return None
+
+SPARK_URL = ("https://query1.finance.yahoo.com/v8/finance/spark"
+             "?symbols={symbols}&range=1d&interval=5m&indicators=close")
+
+def get_spark_prices(tickers):
+    """
+    One tiny JSON request for the whole watchlist via Yahoo's spark
+    endpoint -- no Ticker objects, no DataFrames, tens of bytes per
+    symbol. Returns {sym: price}; None tells the caller to fall back
+    to the heavier yf.download path.
+    """
+    try:
+        url = SPARK_URL.format(symbols=",".join(tickers))
+        payload = get_yf_session().get(url, timeout=10).json()
+        prices = {}
+        for sym in tickers:
+            closes = [c for c in payload[sym]['close'] if c is not None]
+            prices[sym] = closes[-1]
+        return prices
+    except:
+        return None
 
 # --- SECTION 1: MARKET SCANNER ---
 st.header("1. 📡 Live Market Scanner")
 
+if st.button("♻️ Force Refresh Data"):
+    st.cache_data.clear()  # wipe cached prices/charts, next fetch hits Yahoo again
+
 if st.button("🔄 Scan Markets Now", type="primary"):
     with st.spinner('Scanning...'):
-        market_data = ""
         progress = st.progress(0)
-        for i, ticker in enumerate(WATCHLIST):
-            data = get_safe_data(ticker)
-            market_data += data + "\n"
-            progress.progress((i + 1) / len(WATCHLIST))
+        lines = {}
+        prices = get_spark_prices(WATCHLIST)
+        if prices is not None:
+            for i, ticker in enumerate(WATCHLIST):
+                lines[ticker] = f"{ticker}: ${prices[ticker]:,.2f}"
+                progress.progress((i + 1) / len(WATCHLIST))
+        elif (batch := get_batch_data(WATCHLIST)) is not None:
+            for i, ticker in enumerate(WATCHLIST):
+                try:
+                    lines[ticker] = f"{ticker}: ${batch[ticker]['Close'].iloc[-1]:,.2f}"
+                except:
+                    lines[ticker] = f"{ticker}: Data Unavailable"
+                progress.progress((i + 1) / len(WATCHLIST))
+        else:
+            # Batch failed -- fetch per ticker, but in parallel instead of serially.
+            # The 10s budget lives on as_completed (the per-future result()
+            # timeout would be dead code: as_completed only yields futures that
+            # are already done). No `with`: its shutdown(wait=True) would stall
+            # on the very stragglers we just timed out on.
+            ex = ThreadPoolExecutor(max_workers=len(WATCHLIST))
+            try:
+                futures = {ex.submit(get_safe_data, t): t for t in WATCHLIST}
+                for i, fut in enumerate(as_completed(futures, timeout=10)):
+                    try:
+                        lines[futures[fut]] = fut.result()
+                    except:
+                        lines[futures[fut]] = f"{futures[fut]}: Data Unavailable"
+                    progress.progress((i + 1) / len(WATCHLIST))
+            except TimeoutError:
+                pass  # whoever didn't finish gets filled in below
+            finally:
+                ex.shutdown(wait=False, cancel_futures=True)
+            for ticker in WATCHLIST:
+                lines.setdefault(ticker, f"{ticker}: Data Unavailable")
+
+        # join once instead of += in a loop (O(N) instead of O(N^2) copies)
+        market_data = "\n".join(lines[ticker] for ticker in WATCHLIST) + "\n"
         
         st.session_state['market_data'] = market_data
-        prompt = f"Act as a Wall Street Analyst. Data: {market_data}. 1. Market mood summary. 2. Biggest winner."
+        prompts = [
+            PROMPT_MOOD.substitute(data=market_data),
+            PROMPT_WINNER.substitute(data=market_data)
+        ]
+
+        # Kick the LLM summary off in the background so the raw prices paint
+        # immediately instead of after the multi-second Gemini wait
+        result = {}
+        worker = threading.Thread(
+            target=lambda: result.setdefault('answers', batch_ask(prompts, system=SYSTEM_ANALYST))
+        )
+        add_script_run_ctx(worker)  # lets the thread use session_state + caches
+        worker.start()
+
         st.success("Scan Complete")
-        st.markdown(get_gemini_response(prompt))
+        st.code(market_data)
+        worker.join()
+        for answer in result.get('answers', []):
+            st.markdown(answer)
 
 # --- SECTION 2: INTERACTIVE CHARTS ---
 st.divider()
@@ -110,59 +531,84 @@ selected_ticker = st.selectbox("Select a Stock to View Chart:", WATCHLIST)
 
 if selected_ticker:
     try:
-        chart_data = get_chart_data(selected_ticker)
-        fig = px.line(chart_data, y='Close', title=f"{selected_ticker} - 30 Day Price Trend")
-        fig.update_layout(xaxis_title="Date", yaxis_title="Price ($)")
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(build_chart(selected_ticker), use_container_width=True)
     except Exception as e:
         st.error(f"Could not load chart: {e}")
 
 # --- SECTION 3: CHAT ANALYST ---
 st.divider()
-st.header("3. 💬 Ask the Analyst")
-
-col_chat1, col_chat2 = st.columns([3, 1])
-with col_chat1:
-    user_question = st.text_area("Question:", height=100, placeholder="E.g., What is the outlook for Tech?")
-with col_chat2:
-    st.write("Response Style:")
-    response_style = st.radio("Style", ["Short & Direct", "Detailed Analysis"])
-
-if st.button("Run Analysis"):
-    context = st.session_state.get('market_data', "No live data scanned yet.")
-    style = "Keep it under 50 words." if response_style == "Short & Direct" else "Deep professional breakdown."
-    full_prompt = f"ROLE: Hedge Fund Manager. CONTEXT: {context}. USER: {user_question}. STYLE: {style}"
-    
-    with st.spinner("Thinking..."):
-        st.markdown(get_gemini_response(full_prompt))
+
+@st.fragment
+def chat_section():
+    """Fragment: interacting with the chat reruns only this function,
+    not the scanner/chart/strategy code above and below it."""
+    st.header("3. 💬 Ask the Analyst")
+
+    col_chat1, col_chat2 = st.columns([3, 1])
+    with col_chat1:
+        user_question = st.text_area("Question:", height=100, placeholder="E.g., What is the outlook for Tech?")
+    with col_chat2:
+        st.write("Response Style:")
+        response_style = st.radio("Style", ["Short & Direct", "Detailed Analysis"])
+
+    if st.button("Run Analysis"):
+        context = st.session_state.get('market_data', "No live data scanned yet.")
+        style = "Keep it under 50 words." if response_style == "Short & Direct" else "Deep professional breakdown."
+        full_prompt = PROMPT_CHAT.substitute(context=context, question=user_question, style=style)
+
+        with st.spinner("Thinking..."):
+            st.write_stream(stream_gemini(full_prompt, system=SYSTEM_MANAGER))
+
+chat_section()
 
 # --- SECTION 4: PORTFOLIO BUILDER ---
 st.divider()
 st.header("4. 💰 Strategy Builder")
-st.error("⚠️ DISCLAIMER: Educational purposes only.")
-
-col1, col2 = st.columns([1, 2])
-with col1:
-    investment = st.number_input("Investment Amount ($)", min_value=100, value=1000, step=100)
-    risk_level = st.radio("Select Risk Tolerance", ["Very Low", "Low", "Moderate", "High", "Very High"])
-    generate_btn = st.button("Generate Strategy")
 
-risk_map = {
+# Frozen so nothing can mutate it between reruns -- allocated once at import
+risk_map = MappingProxyType({
     "Very Low": {"Bonds": 70, "Cash": 20, "Index Funds": 10},
     "Low": {"Bonds": 50, "Index Funds": 30, "Cash": 10, "Stocks": 10},
     "Moderate": {"Index Funds": 40, "Stocks": 30, "Bonds": 20, "Cash": 10},
     "High": {"Stocks": 50, "Crypto": 30, "Index Funds": 10, "Tech ETFs": 10},
     "Very High": {"Crypto": 60, "Tech Options": 20, "Stocks": 20}
-}
-
-with col2:
-    if generate_btn:
-        allocations = risk_map[risk_level]
-        df = pd.DataFrame(list(allocations.items()), columns=['Asset', 'Percentage'])
-        fig = px.pie(df, values='Percentage', names='Asset', title=f"Allocation for ${investment:,.0f}")
-        st.plotly_chart(fig, use_container_width=True)
-        
-        st.subheader("📋 Detailed Buying Guide")
-        ai_prompt = f"Advisor role. Budget: ${investment}. Risk: {risk_level}. Allocation: {allocations}. Give specific ticker recommendations."
-        with st.spinner("Calculating..."):
-            st.markdown(get_gemini_response(ai_prompt))
+})
+
+# Non-zero slices precomputed once at import -- the click path only does a lookup
+RISK_ALLOCS = {level: tuple((asset, pct) for asset, pct in alloc.items() if pct > 0)
+               for level, alloc in risk_map.items()}
+
+@st.cache_data(show_spinner=False)
+def build_pie(risk_level):
+    """The pie only depends on the risk level, so cache it and set the
+    investment-specific title on the (copied) figure at call time."""
+    import plotly.graph_objects as go  # deferred: sys.modules makes repeat imports free
+    # go.Pie directly -- skips plotly.express's validation/transform pipeline
+    # (and graph_objects is a lighter import than express)
+    items = RISK_ALLOCS[risk_level]
+    return go.Figure(go.Pie(labels=[asset for asset, _ in items],
+                            values=[pct for _, pct in items]))
+
+# A checkbox, not an expander: Streamlit still executes code inside a
+# collapsed expander, whereas an unticked checkbox truly skips the section
+if st.checkbox("Enable Strategy Builder", key='enable_sb'):
+    st.error("⚠️ DISCLAIMER: Educational purposes only.")
+
+    col1, col2 = st.columns([1, 2])
+    with col1:
+        investment = st.number_input("Investment Amount ($)", min_value=100, value=1000, step=100)
+        risk_level = st.radio("Select Risk Tolerance", ["Very Low", "Low", "Moderate", "High", "Very High"])
+        generate_btn = st.button("Generate Strategy")
+
+    with col2:
+        if generate_btn:
+            allocations = risk_map[risk_level]
+            fig = build_pie(risk_level)
+            fig.update_layout(title=f"Allocation for ${investment:,.0f}")
+            st.plotly_chart(fig, use_container_width=True)
+
+            st.subheader("📋 Detailed Buying Guide")
+            ai_prompt = PROMPT_STRATEGY.substitute(budget=investment, risk=risk_level, alloc=allocations)
+            with st.spinner("Calculating..."):
+                # Allocations only change when the inputs do, so a day-long TTL is safe
+                st.write_stream(stream_gemini(ai_prompt, ttl=86400, system=SYSTEM_ADVISOR))